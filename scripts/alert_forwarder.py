@@ -15,7 +15,7 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import SURICATA_ALERT_LOG, ALERT_ENDPOINT
+from src.config import SURICATA_ALERT_LOG, ALERT_ENDPOINT, SOCKETIO_MESSAGE_QUEUE
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +42,15 @@ class SuricataAlertForwarder:
         self.endpoint = endpoint or ALERT_ENDPOINT
         self.position = 0
         
+        # Emit straight to the dashboard's message queue when configured
+        self.external_sio = None
+        if SOCKETIO_MESSAGE_QUEUE:
+            try:
+                from flask_socketio import SocketIO
+                self.external_sio = SocketIO(message_queue=SOCKETIO_MESSAGE_QUEUE)
+            except Exception as e:
+                logger.warning(f"Message queue unavailable, forwarding over HTTP: {e}")
+        
         logger.info("Suricata Alert Forwarder initialized")
         logger.info(f"Monitoring: {self.log_file}")
         logger.info(f"Forwarding to: {self.endpoint}")
@@ -135,6 +144,11 @@ class SuricataAlertForwarder:
             True if successful
         """
         try:
+            if self.external_sio is not None:
+                self.external_sio.emit('security_alert', alert)
+                logger.info(f"Alert forwarded: {alert['message']}")
+                return True
+            
             response = requests.post(
                 self.endpoint,
                 json=alert,
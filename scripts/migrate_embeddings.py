@@ -0,0 +1,61 @@
+"""
+Smart Vault CCTV - Migrate Log Embeddings to Binary
+One-shot conversion of list-valued detection log embeddings to float32 bytes
+"""
+
+import os
+import sys
+
+from pymongo import UpdateOne
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db_connection import DB, encode_embedding
+
+
+BATCH_SIZE = 500
+
+
+def main():
+    """Convert every array-valued embedding in the logs collection"""
+    print("=" * 70)
+    print("  Smart Vault CCTV - Embedding Migration")
+    print("=" * 70)
+    print()
+
+    db = DB()
+
+    # $type 'array' matches documents still storing a float list
+    cursor = db.logs_coll.find(
+        {'embedding': {'$type': 'array'}},
+        {'embedding': 1}
+    ).batch_size(BATCH_SIZE)
+
+    converted = 0
+    ops = []
+    for log in cursor:
+        ops.append(UpdateOne(
+            {'_id': log['_id']},
+            {'$set': {'embedding': encode_embedding(log['embedding'])}}
+        ))
+        if len(ops) >= BATCH_SIZE:
+            converted += db.logs_coll.bulk_write(ops, ordered=False).modified_count
+            ops = []
+            print(f"  Converted {converted} logs...", end='\r')
+
+    if ops:
+        converted += db.logs_coll.bulk_write(ops, ordered=False).modified_count
+
+    print(f"\n✓ Converted {converted} detection log embeddings")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\nMigration interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,53 @@
+"""
+Smart Vault CCTV - Face Box Kernels
+JIT-compiled face selection and bounding box clamping
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _pick_largest_and_clamp(faces, W, H):
+    """
+    Pick the largest face by area and clamp it to the image bounds.
+
+    Args:
+        faces: Face boxes as int32 array, shape (N, 4) of (x, y, w, h)
+        W: Image width
+        H: Image height
+
+    Returns:
+        Clamped (x, y, w, h), or (0, 0, 0, 0) if the largest box is invalid
+    """
+    best = 0
+    best_area = -1
+    for i in range(faces.shape[0]):
+        area = np.int64(faces[i, 2]) * np.int64(faces[i, 3])
+        if area > best_area:
+            best_area = area
+            best = i
+
+    x = faces[best, 0]
+    y = faces[best, 1]
+    w = faces[best, 2]
+    h = faces[best, 3]
+    if w <= 0 or h <= 0 or x < 0 or y < 0:
+        return 0, 0, 0, 0
+
+    x = min(x, W - 1)
+    y = min(y, H - 1)
+    w = min(w, W - x)
+    h = min(h, H - y)
+    return x, y, w, h
+
+
+# Same code either way; without Numba it runs as plain Python
+if NUMBA_AVAILABLE:
+    pick_largest_and_clamp = njit(cache=True)(_pick_largest_and_clamp)
+else:
+    pick_largest_and_clamp = _pick_largest_and_clamp
@@ -69,6 +69,17 @@ USE_GPU = os.getenv('USE_GPU', 'false').lower() == 'true'
 # Use Faiss for fast search when authorized count exceeds this threshold
 FAISS_THRESHOLD = int(os.getenv('FAISS_THRESHOLD', 50))
 
+# Number of recent Faiss query results to keep in the LRU cache (0 disables)
+FAISS_QUERY_CACHE_SIZE = int(os.getenv('FAISS_QUERY_CACHE_SIZE', 512))
+
+# Extract dashboard embeddings in a background worker process (loads a
+# second copy of the model; analyze requests return 202 and are polled)
+USE_EMBEDDING_WORKER = os.getenv('USE_EMBEDDING_WORKER', 'false').lower() == 'true'
+
+# Maximum faces per worker batch and how long to wait for a batch to fill
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 8))
+EMBEDDING_BATCH_TIMEOUT = float(os.getenv('EMBEDDING_BATCH_TIMEOUT', 0.01))
+
 # ===========================
 # Face Preprocessing
 # ===========================
@@ -123,12 +134,22 @@ SESSION_TIMEOUT = 30
 DEFAULT_ADMIN_USER = os.getenv('ADMIN_USER', 'admin')
 DEFAULT_ADMIN_PASS = os.getenv('ADMIN_PASS', 'changeme')
 
+# Cache password verification results briefly to skip repeated hashing
+USE_VERIFY_PASSWORD_CACHE = os.getenv('USE_VERIFY_PASSWORD_CACHE', 'false').lower() == 'true'
+VERIFY_PASSWORD_CACHE_TTL = int(os.getenv('VERIFY_PASSWORD_CACHE_TTL', 30))  # seconds
+
 # ===========================
 # WebSocket Configuration
 # ===========================
-SOCKETIO_ASYNC_MODE = 'threading'
+# 'threading' for the development server, 'eventlet' under gunicorn
+# (src/webapp/wsgi.py sets this automatically)
+SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
 SOCKETIO_CORS_ALLOWED_ORIGINS = '*'
 
+# Message queue shared by the dashboard and external emitters (main.py,
+# alert forwarder), e.g. redis://localhost:6379/0. Empty = HTTP POST bridge
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+
 # ===========================
 # Unknown Face Handling
 # ===========================
@@ -162,12 +183,19 @@ ENABLE_FAIL2BAN = os.getenv('ENABLE_FAIL2BAN', 'false').lower() == 'true'
 # Login attempt limit
 MAX_LOGIN_ATTEMPTS = 5
 
+# How long the dashboard blocks an IP after too many failed logins (seconds)
+BRUTE_FORCE_BLOCK_SECONDS = int(os.getenv('BRUTE_FORCE_BLOCK_SECONDS', 300))
+
 # Ban duration (seconds)
 BAN_DURATION = 3600  # 1 hour
 
 # Whitelisted IPs (never ban)
 WHITELISTED_IPS = os.getenv('WHITELISTED_IPS', '127.0.0.1,::1').split(',')
 
+# Redis URL for shared login-attempt tracking across workers
+# (empty = per-process in-memory tracking)
+REDIS_URL = os.getenv('REDIS_URL', '')
+
 # ===========================
 # Suricata IDS Configuration
 # ===========================
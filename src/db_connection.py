@@ -9,8 +9,9 @@ from typing import Optional, Dict, List, Any
 import io
 
 from pymongo import MongoClient, errors
-from gridfs import GridFS
+from gridfs import GridFS, GridOut
 from bson.objectid import ObjectId
+from bson.binary import Binary
 import numpy as np
 
 from src.config import MONGO_URI, DB_NAME, AUTH_COLLECTION, LOGS_COLLECTION, GRIDFS_BUCKET
@@ -20,6 +21,32 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def encode_embedding(embedding) -> Binary:
+    """Pack an embedding as raw float32 bytes for storage"""
+    return Binary(np.asarray(embedding, dtype=np.float32).tobytes())
+
+
+def decode_embedding(value) -> np.ndarray:
+    """
+    Unpack a stored embedding into a float32 array.
+    
+    Accepts raw float32 bytes (zero-copy) as well as legacy float lists.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+# Matches datetime.isoformat() closely enough for the dashboard (ms precision,
+# no zone suffix so browsers keep treating stored times as local)
+ISO_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%L'
+
+
+def date_to_string(expr) -> Dict:
+    """Aggregation expression formatting a date field (or null) as an ISO string"""
+    return {'$dateToString': {'format': ISO_DATE_FORMAT, 'date': expr}}
+
+
 class DB:
     """
     MongoDB database wrapper with GridFS support for Smart Vault CCTV system.
@@ -260,7 +287,7 @@ class DB:
                 'name': name,
                 'confidence': float(confidence),
                 'status': status,
-                'embedding': embedding.tolist() if isinstance(embedding, np.ndarray) else embedding,
+                'embedding': encode_embedding(embedding),
                 'image_id': str(image_id),
                 'camera_id': camera_id,
                 'review_flag': review_flag,
@@ -279,7 +306,8 @@ class DB:
             raise
     
     def get_detection_logs(self, limit: int = 100, status: str = None,
-                          camera_id: str = None, review_flag: bool = None) -> List[Dict]:
+                          camera_id: str = None, review_flag: bool = None,
+                          format_dates: bool = False) -> List[Dict]:
         """
         Retrieve detection logs with optional filters.
         
@@ -288,6 +316,7 @@ class DB:
             status: Filter by status ("Authorized" or "Unauthorized")
             camera_id: Filter by camera
             review_flag: Filter by review flag
+            format_dates: Return timestamps as ISO strings formatted by MongoDB
         
         Returns:
             List of log documents
@@ -301,11 +330,21 @@ class DB:
             if review_flag is not None:
                 query['review_flag'] = review_flag
             
-            logs = list(self.logs_coll.find(query).sort('timestamp', -1).limit(limit))
+            if format_dates:
+                pipeline = [{'$match': query}, {'$sort': {'timestamp': -1}}]
+                # find().limit(0) means no limit, but $limit rejects values <= 0
+                if limit > 0:
+                    pipeline.append({'$limit': limit})
+                pipeline.append({'$addFields': {'timestamp': date_to_string('$timestamp')}})
+                logs = list(self.logs_coll.aggregate(pipeline))
+            else:
+                logs = list(self.logs_coll.find(query).sort('timestamp', -1).limit(limit))
             
-            # Convert ObjectIds to strings
+            # Convert ObjectIds to strings and binary embeddings to lists for JSON
             for log in logs:
                 log['_id'] = str(log['_id'])
+                if 'embedding' in log:
+                    log['embedding'] = decode_embedding(log['embedding']).tolist()
             
             logger.info(f"✓ Retrieved {len(logs)} detection logs")
             return logs
@@ -314,6 +353,32 @@ class DB:
             logger.error(f"✗ Failed to retrieve logs: {e}")
             raise
     
+    def save_image(self, image_bytes: bytes, filename: str = 'face.jpg',
+                   metadata: Dict = None) -> str:
+        """
+        Store an image in GridFS.
+        
+        Args:
+            image_bytes: Image bytes (JPEG)
+            filename: Stored filename
+            metadata: Optional GridFS metadata
+        
+        Returns:
+            GridFS file ID (str)
+        """
+        try:
+            image_id = self.fs.put(
+                image_bytes,
+                filename=filename,
+                content_type='image/jpeg',
+                metadata=metadata or {}
+            )
+            logger.debug(f"✓ Saved image: {image_id}")
+            return str(image_id)
+        except Exception as e:
+            logger.error(f"✗ Failed to save image: {e}")
+            raise
+    
     def get_image(self, file_id: str) -> Optional[bytes]:
         """
         Retrieve an image from GridFS by file ID.
@@ -333,6 +398,22 @@ class DB:
             logger.error(f"✗ Failed to retrieve image {file_id}: {e}")
             return None
     
+    def open_image(self, file_id: str) -> Optional[GridOut]:
+        """
+        Open an image in GridFS for streaming reads.
+        
+        Args:
+            file_id: GridFS file ID (string)
+        
+        Returns:
+            GridOut file handle or None if not found
+        """
+        try:
+            return self.fs.get(ObjectId(file_id))
+        except Exception as e:
+            logger.error(f"✗ Failed to open image {file_id}: {e}")
+            return None
+    
     def delete_authorized_face(self, name: str) -> bool:
         """
         Delete an authorized face from the database.
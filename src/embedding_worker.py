@@ -0,0 +1,175 @@
+"""
+Smart Vault CCTV - Background Embedding Worker
+Runs embedding extraction in a dedicated process, batching queued faces
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import uuid
+from typing import Optional, Tuple
+
+import numpy as np
+from cachetools import TTLCache
+
+from src.config import EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_loop(task_q, result_q, batch_size: int, batch_timeout: float):
+    """
+    Worker process main loop: collect up to batch_size faces, waiting at most
+    batch_timeout seconds after the first one, then embed them together.
+    """
+    # Import inside the child so the model is loaded in this process only
+    from src.face_utils import get_face_utils
+    face_utils = get_face_utils()
+
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+
+        batch = [task]
+        while len(batch) < batch_size:
+            try:
+                task = task_q.get(timeout=batch_timeout)
+            except queue.Empty:
+                break
+            if task is None:
+                task_q.put(None)  # Re-queue shutdown after this batch
+                break
+            batch.append(task)
+
+        job_ids = [job_id for job_id, _ in batch]
+        try:
+            embeddings = face_utils.get_embeddings([face for _, face in batch])
+            for job_id, embedding in zip(job_ids, embeddings):
+                result_q.put((job_id, embedding, None))
+        except MemoryError:
+            for job_id in job_ids:
+                result_q.put((job_id, None, 'Out of memory'))
+        except Exception as e:
+            for job_id in job_ids:
+                result_q.put((job_id, None, str(e)))
+
+
+class EmbeddingWorker:
+    """
+    Client for the background embedding process.
+
+    submit() and poll() only wait on queue I/O, never on the model. The
+    queues still block green threads, so under eventlet call them through
+    tpool (see app.py).
+    """
+
+    def __init__(self, batch_size: int = None, batch_timeout: float = None):
+        """
+        Initialize worker client (the process starts on first submit).
+
+        Args:
+            batch_size: Maximum faces per batch (default: from config)
+            batch_timeout: Seconds to wait for a batch to fill (default: from config)
+        """
+        self.batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        self.batch_timeout = batch_timeout or EMBEDDING_BATCH_TIMEOUT
+        # Spawn rather than fork: TensorFlow state is not fork-safe
+        self._ctx = multiprocessing.get_context('spawn')
+        self._task_q = None
+        self._result_q = None
+        self._process = None
+        self._lock = threading.Lock()
+        # poll() runs on several threads (tpool / request threads) and
+        # TTLCache is not thread-safe, so results are guarded separately
+        self._results_lock = threading.Lock()
+        self._results = TTLCache(maxsize=1024, ttl=300)
+
+    def start(self):
+        """Start the worker process if it is not running"""
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                return
+            self._task_q = self._ctx.Queue()
+            self._result_q = self._ctx.Queue()
+            self._process = self._ctx.Process(
+                target=_worker_loop,
+                args=(self._task_q, self._result_q, self.batch_size, self.batch_timeout),
+                daemon=True
+            )
+            self._process.start()
+            logger.info(f"✓ Embedding worker started (pid: {self._process.pid})")
+
+    def submit(self, face_img: np.ndarray) -> str:
+        """
+        Queue a face for embedding extraction.
+
+        Args:
+            face_img: Aligned face image (BGR format)
+
+        Returns:
+            Job ID to pass to poll()
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        self._task_q.put((job_id, face_img))
+        return job_id
+
+    def poll(self, job_id: str) -> Tuple[bool, Optional[np.ndarray], Optional[str]]:
+        """
+        Check whether a job has finished.
+
+        Args:
+            job_id: Job ID returned by submit()
+
+        Returns:
+            (done, embedding, error) tuple
+        """
+        with self._results_lock:
+            self._drain()
+            result = self._results.pop(job_id, None)
+        if result is not None:
+            embedding, error = result
+            return True, embedding, error
+
+        # A dead worker will never answer; report it instead of leaving
+        # the client polling until it gives up
+        process = self._process
+        if process is None or not process.is_alive():
+            return True, None, 'Embedding worker is not running'
+        return False, None, None
+
+    def _drain(self):
+        """Move finished results from the result queue without blocking (call under _results_lock)"""
+        if self._result_q is None:
+            return
+        while True:
+            try:
+                job_id, embedding, error = self._result_q.get_nowait()
+            except queue.Empty:
+                break
+            self._results[job_id] = (embedding, error)
+
+    def stop(self):
+        """Stop the worker process"""
+        with self._lock:
+            if self._process is None:
+                return
+            self._task_q.put(None)
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+
+
+# Singleton instance
+_embedding_worker = None
+
+
+def get_embedding_worker() -> EmbeddingWorker:
+    """Get or create singleton EmbeddingWorker instance"""
+    global _embedding_worker
+    if _embedding_worker is None:
+        _embedding_worker = EmbeddingWorker()
+    return _embedding_worker
@@ -212,7 +212,41 @@ class FaceUtils:
         except Exception as e:
             logger.debug(f"Embedding extraction error: {e}")
             return None
-    
+
+    def get_embeddings(self, face_imgs: List[np.ndarray], model: str = None) -> List[Optional[np.ndarray]]:
+        """
+        Extract embeddings for a batch of face images.
+
+        Args:
+            face_imgs: List of aligned face images (BGR format)
+            model: Model name (default: from config)
+
+        Returns:
+            List of normalized embeddings (None where extraction failed)
+        """
+        if DeepFace is None or len(face_imgs) < 2:
+            return [self.get_embedding(face_img, model) for face_img in face_imgs]
+        
+        model_name = model or self.model_name
+        try:
+            # DeepFace.represent takes one image per call; with detection
+            # skipped it only resizes and runs the model, so do that for the
+            # whole batch in a single forward pass
+            from deepface.commons import functions
+            face_model = DeepFace.build_model(model_name)
+            if "keras" not in str(type(face_model)):
+                # Non-Keras wrappers (SFace, Dlib) predict one image at a time
+                return [self.get_embedding(face_img, model) for face_img in face_imgs]
+            
+            target_size = functions.find_target_size(model_name=model_name)
+            batch = np.stack([cv2.resize(face_img, target_size) for face_img in face_imgs])
+            batch = functions.normalize_input(img=batch, normalization="base")
+            embeddings = face_model.predict(batch, verbose=0)
+            return [self._normalize_embedding(np.asarray(e)) for e in embeddings]
+        except Exception as e:
+            logger.debug(f"Batched embedding extraction error: {e}")
+            return [self.get_embedding(face_img, model) for face_img in face_imgs]
+
     def _normalize_embedding(self, embedding: np.ndarray) -> np.ndarray:
         """
         Normalize embedding to unit vector (L2 normalization).
@@ -12,7 +12,6 @@ from datetime import datetime
 from collections import deque
 from typing import Dict, List, Tuple, Optional
 import time
-import base64
 import requests
 
 # Add parent directory to path
@@ -27,7 +26,7 @@ from src.config import (
     MATCH_THRESHOLD, MULTIFRAME_COUNT, PROCESS_EVERY_N_FRAMES,
     SHOW_DEBUG_WINDOW, SAVE_UNKNOWN_FACES, UNKNOWN_MIN_CONFIDENCE,
     AUTO_REVIEW_THRESHOLD, ENABLE_ADAPTIVE_UPDATE, ADAPTIVE_ALPHA,
-    ADAPTIVE_UPDATE_FREQUENCY
+    ADAPTIVE_UPDATE_FREQUENCY, SOCKETIO_MESSAGE_QUEUE
 )
 
 # Configure logging
@@ -84,6 +83,17 @@ class FaceRecognitionSystem:
         self.last_stream_time = 0
         self.stream_interval = 0.1  # Stream every 100ms (10 fps)
         
+        # Publish frames straight to the dashboard's message queue when
+        # configured, skipping the HTTP round trip through the web worker
+        self.external_sio = None
+        if SOCKETIO_MESSAGE_QUEUE:
+            try:
+                from flask_socketio import SocketIO
+                self.external_sio = SocketIO(message_queue=SOCKETIO_MESSAGE_QUEUE)
+                logger.info("✓ Streaming via SocketIO message queue")
+            except Exception as e:
+                logger.warning(f"Message queue unavailable, streaming over HTTP: {e}")
+        
         logger.info("=" * 60)
         logger.info("✓ System initialized successfully")
     
@@ -391,15 +401,20 @@ class FaceRecognitionSystem:
             # Encode frame to JPEG
             _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
             
-            # Convert to base64
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
+            frame_bytes = buffer.tobytes()
             
-            # Send to Flask server (non-blocking)
-            requests.post(
-                self.stream_url,
-                json={'frame': frame_base64},
-                timeout=0.1
-            )
+            # Frames travel as raw JPEG bytes (WebSocket binary frames), no base64
+            if self.external_sio is not None:
+                # Publish to the message queue; the dashboard fans it out
+                self.external_sio.emit('video_frame', {'frame': frame_bytes})
+            else:
+                # Send to Flask server (non-blocking)
+                requests.post(
+                    self.stream_url,
+                    data=frame_bytes,
+                    headers={'Content-Type': 'image/jpeg'},
+                    timeout=0.1
+                )
             
             self.last_stream_time = current_time
             
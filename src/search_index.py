@@ -8,18 +8,43 @@ import numpy as np
 from typing import List, Tuple, Optional
 import pickle
 import os
+import threading
+from collections import OrderedDict
 
-try:
-    import faiss
-    FAISS_AVAILABLE = True
-except ImportError:
-    FAISS_AVAILABLE = False
-    logging.warning("Faiss not available. Install with: pip install faiss-cpu")
-
-from src.config import FAISS_THRESHOLD
+from src.config import FAISS_THRESHOLD, FAISS_QUERY_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Faiss is imported on first use; loading it links BLAS and is slow, so
+# processes that never build an index (web workers, forks) skip the cost
+_faiss = None
+_faiss_import_attempted = False
+
+
+def _get_faiss():
+    """Import faiss on first call and cache the module (None if unavailable)"""
+    global _faiss, _faiss_import_attempted
+    if not _faiss_import_attempted:
+        _faiss_import_attempted = True
+        try:
+            import faiss
+            _faiss = faiss
+        except ImportError:
+            logging.warning("Faiss not available. Install with: pip install faiss-cpu")
+    return _faiss
+
+
+def faiss_available() -> bool:
+    """Check whether faiss can be imported"""
+    return _get_faiss() is not None
+
+
+def __getattr__(name):
+    # Backwards compatible lazy FAISS_AVAILABLE flag
+    if name == 'FAISS_AVAILABLE':
+        return faiss_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class FaissSearchIndex:
     """
@@ -34,7 +59,8 @@ class FaissSearchIndex:
         Args:
             dimension: Embedding dimension (default: 512 for ArcFace)
         """
-        if not FAISS_AVAILABLE:
+        self._faiss = _get_faiss()
+        if self._faiss is None:
             raise ImportError("Faiss is required. Install with: pip install faiss-cpu")
         
         self.dimension = dimension
@@ -42,6 +68,19 @@ class FaissSearchIndex:
         self.names = []
         self.embeddings = []
         self.is_trained = False
+        self.index_type = None
+        self._search_impl = None
+        
+        # LRU cache of recent query results (see _cache_key); the lock
+        # guards it against concurrent callers, and the generation is bumped
+        # on every index change so results from an old index are never stored
+        self._query_cache = OrderedDict()
+        self._cache_cap = FAISS_QUERY_CACHE_SIZE
+        self._cache_lock = threading.Lock()
+        self._cache_gen = 0
+        
+        # Per-thread (1, D) float32 query buffer, reused across queries
+        self._local = threading.local()
         
         logger.info(f"Initialized Faiss index (dimension: {dimension})")
     
@@ -78,11 +117,11 @@ class FaissSearchIndex:
             if index_type == 'IP':
                 # Inner Product (for normalized vectors, equivalent to cosine similarity)
                 # Normalize embeddings first
-                faiss.normalize_L2(embeddings_matrix)
-                self.index = faiss.IndexFlatIP(self.dimension)
+                self._faiss.normalize_L2(embeddings_matrix)
+                self.index = self._faiss.IndexFlatIP(self.dimension)
             else:
                 # L2 distance (Euclidean)
-                self.index = faiss.IndexFlatL2(self.dimension)
+                self.index = self._faiss.IndexFlatL2(self.dimension)
             
             # Add vectors to index
             self.index.add(embeddings_matrix)
@@ -91,6 +130,9 @@ class FaissSearchIndex:
             self.names = names.copy()
             self.embeddings = embeddings_matrix
             self.is_trained = True
+            self._bind_search(index_type)
+            # Last, so any query that overlapped the rebuild is not cached
+            self._reset_query_cache()
             
             logger.info(f"✓ Built Faiss index with {len(names)} faces")
             return True
@@ -99,47 +141,53 @@ class FaissSearchIndex:
             logger.error(f"Failed to build Faiss index: {e}")
             return False
     
-    def query_index(self, embedding: np.ndarray, k: int = 1) -> List[Tuple[str, float]]:
+    def query_index(self, embedding: np.ndarray, k: int = 1,
+                    return_distance: bool = False) -> List[Tuple[str, float]]:
         """
         Query index for nearest neighbors.
         
         Args:
             embedding: Query face embedding
             k: Number of nearest neighbors to return
+            return_distance: If True, return raw Faiss scores (L2 distance or
+                inner product) instead of similarity scores
         
         Returns:
-            List of (name, similarity_score) tuples, sorted by similarity
+            List of (name, similarity_score) tuples, sorted by similarity.
+            For L2 indexes the score is exp(-distance / 10), a monotonic
+            transform of the distance, so ranking and thresholding behave
+            the same as on the raw distance.
         """
         try:
             if not self.is_trained or self.index is None:
                 logger.warning("Index not trained. Call build_index first.")
                 return []
             
-            # Prepare query vector
-            query_vector = np.array([embedding]).astype('float32')
+            # Check query cache
+            cache_key = None
+            if self._cache_cap > 0:
+                cache_key = (self._cache_key(embedding), k, return_distance)
+                with self._cache_lock:
+                    generation = self._cache_gen
+                    cached = self._query_cache.get(cache_key)
+                    if cached is not None:
+                        self._query_cache.move_to_end(cache_key)
+                        return list(cached)
             
-            # Normalize if using Inner Product index
-            if isinstance(self.index, faiss.IndexFlatIP):
-                faiss.normalize_L2(query_vector)
-            
-            # Search
+            # Search with the variant bound for this index type
             k = min(k, len(self.names))  # Can't return more than we have
-            distances, indices = self.index.search(query_vector, k)
+            results = self._search_impl(embedding, k, return_distance)
             
-            # Build results
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx >= 0 and idx < len(self.names):
-                    # Convert distance to similarity score
-                    if isinstance(self.index, faiss.IndexFlatIP):
-                        # Inner product is already similarity (higher is better)
-                        similarity = float(dist)
-                    else:
-                        # L2 distance: convert to similarity (lower distance = higher similarity)
-                        # Use exponential decay: similarity = exp(-distance)
-                        similarity = float(np.exp(-dist / 10))
-                    
-                    results.append((self.names[idx], similarity))
+            # Store in query cache, evicting the least recently used entry;
+            # skip it if the index changed while we were searching
+            if cache_key is not None:
+                with self._cache_lock:
+                    if self._cache_gen != generation:
+                        return results
+                    self._query_cache[cache_key] = tuple(results)
+                    self._query_cache.move_to_end(cache_key)
+                    if len(self._query_cache) > self._cache_cap:
+                        self._query_cache.popitem(last=False)
             
             return results
             
@@ -147,6 +195,72 @@ class FaissSearchIndex:
             logger.error(f"Faiss query error: {e}")
             return []
     
+    def _reset_query_cache(self):
+        """Drop cached query results after the index changes"""
+        with self._cache_lock:
+            self._query_cache.clear()
+            self._cache_gen += 1
+    
+    def _cache_key(self, embedding: np.ndarray) -> bytes:
+        """
+        Query cache key for an embedding.
+        
+        IP scores depend only on direction, so the L2-normalized vector is
+        quantized to int8 and near-identical faces from consecutive frames
+        share an entry. L2 distances also depend on magnitude, so L2 queries
+        (and zero vectors) key on the exact float32 bytes.
+        """
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        if self.index_type == 'IP':
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                return np.clip(np.rint(vector / norm * 127), -127, 127).astype(np.int8).tobytes()
+        return vector.tobytes()
+    
+    def _bind_search(self, index_type: str):
+        """Select the query variant for this index type once, at build/load time"""
+        self.index_type = 'IP' if index_type == 'IP' else 'L2'
+        self._search_impl = self._search_ip if self.index_type == 'IP' else self._search_l2
+    
+    def _search_ip(self, embedding: np.ndarray, k: int,
+                   return_distance: bool) -> List[Tuple[str, float]]:
+        """Inner product search; scores are already similarities"""
+        query_vector = self._get_query_buffer()
+        query_vector[0] = embedding
+        self._faiss.normalize_L2(query_vector)
+        
+        distances, indices = self.index.search(query_vector, k)
+        
+        # Drop missing neighbours (Faiss pads with -1)
+        valid = indices[0] >= 0
+        names = [self.names[i] for i in indices[0][valid]]
+        return list(zip(names, distances[0][valid].tolist()))
+    
+    def _search_l2(self, embedding: np.ndarray, k: int,
+                   return_distance: bool) -> List[Tuple[str, float]]:
+        """L2 search; distances are mapped to exp(-d / 10) unless raw is requested"""
+        query_vector = self._get_query_buffer()
+        query_vector[0] = embedding
+        
+        distances, indices = self.index.search(query_vector, k)
+        
+        # Drop missing neighbours (Faiss pads with -1)
+        valid = indices[0] >= 0
+        scores = distances[0][valid]
+        if not return_distance:
+            scores = np.exp(-scores * 0.1)
+        
+        names = [self.names[i] for i in indices[0][valid]]
+        return list(zip(names, scores.tolist()))
+    
+    def _get_query_buffer(self) -> np.ndarray:
+        """Get this thread's preallocated query buffer, resizing on dimension change"""
+        buf = getattr(self._local, 'query_buf', None)
+        if buf is None or buf.shape[1] != self.dimension:
+            buf = np.empty((1, self.dimension), dtype=np.float32)
+            self._local.query_buf = buf
+        return buf
+    
     def update_embedding(self, name: str, new_embedding: np.ndarray) -> bool:
         """
         Update an embedding in the index (requires rebuild).
@@ -170,7 +284,8 @@ class FaissSearchIndex:
             self.embeddings[idx] = new_embedding
             
             # Rebuild index
-            return self.build_index(self.embeddings.tolist(), self.names)
+            return self.build_index(self.embeddings.tolist(), self.names,
+                                    index_type=self.index_type)
             
         except Exception as e:
             logger.error(f"Failed to update embedding: {e}")
@@ -194,7 +309,8 @@ class FaissSearchIndex:
             embeddings_list.append(embedding)
             
             # Rebuild index
-            return self.build_index(embeddings_list, self.names)
+            return self.build_index(embeddings_list, self.names,
+                                    index_type=self.index_type or 'L2')
             
         except Exception as e:
             logger.error(f"Failed to add face: {e}")
@@ -222,10 +338,12 @@ class FaissSearchIndex:
             
             # Rebuild index
             if len(self.names) > 0:
-                return self.build_index(embeddings_list, self.names)
+                return self.build_index(embeddings_list, self.names,
+                                        index_type=self.index_type)
             else:
                 self.index = None
                 self.is_trained = False
+                self._reset_query_cache()
                 return True
             
         except Exception as e:
@@ -248,13 +366,14 @@ class FaissSearchIndex:
                 return False
             
             # Save Faiss index
-            faiss.write_index(self.index, filepath + '.faiss')
+            self._faiss.write_index(self.index, filepath + '.faiss')
             
             # Save metadata
             metadata = {
                 'names': self.names,
                 'embeddings': self.embeddings,
-                'dimension': self.dimension
+                'dimension': self.dimension,
+                'index_type': self.index_type
             }
             with open(filepath + '.meta', 'wb') as f:
                 pickle.dump(metadata, f)
@@ -278,7 +397,7 @@ class FaissSearchIndex:
         """
         try:
             # Load Faiss index
-            self.index = faiss.read_index(filepath + '.faiss')
+            self.index = self._faiss.read_index(filepath + '.faiss')
             
             # Load metadata
             with open(filepath + '.meta', 'rb') as f:
@@ -289,6 +408,13 @@ class FaissSearchIndex:
             self.dimension = metadata['dimension']
             self.is_trained = True
             
+            # Older metadata files predate 'index_type'; infer it once here
+            index_type = metadata.get('index_type')
+            if index_type is None:
+                index_type = 'IP' if isinstance(self.index, self._faiss.IndexFlatIP) else 'L2'
+            self._bind_search(index_type)
+            self._reset_query_cache()
+            
             logger.info(f"✓ Loaded Faiss index from {filepath} ({len(self.names)} faces)")
             return True
             
@@ -322,7 +448,7 @@ def get_search_index(dimension: int = 512) -> Optional[FaissSearchIndex]:
     """
     global _search_index
     
-    if not FAISS_AVAILABLE:
+    if not faiss_available():
         return None
     
     if _search_index is None:
@@ -341,14 +467,14 @@ def should_use_faiss(num_faces: int) -> bool:
     Returns:
         True if Faiss should be used
     """
-    return FAISS_AVAILABLE and num_faces >= FAISS_THRESHOLD
+    return num_faces >= FAISS_THRESHOLD and faiss_available()
 
 
 if __name__ == '__main__':
     # Test Faiss index
     print("Testing Faiss Search Index...")
     
-    if not FAISS_AVAILABLE:
+    if not faiss_available():
         print("✗ Faiss not available. Install with: pip install faiss-cpu")
         exit(1)
     
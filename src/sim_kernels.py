@@ -0,0 +1,54 @@
+"""
+Smart Vault CCTV - Similarity Kernels
+JIT-compiled batch similarity kernels for small embedding sets
+"""
+
+import logging
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Below this many rows the JIT kernel beats BLAS (no GEMV setup overhead)
+BLAS_CROSSOVER = 256
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _batch_dot_jit(ref, matrix):
+        n, d = matrix.shape
+        out = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            s = 0.0
+            for j in range(d):
+                s += ref[j] * matrix[i, j]
+            out[i] = s
+        return out
+
+
+def batch_cosine(ref: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of one embedding against each row of a matrix.
+
+    Inputs must already be L2-normalized, so this is a plain dot product.
+    Uses the Numba kernel for small batches and BLAS otherwise.
+
+    Args:
+        ref: Reference embedding, shape (D,)
+        matrix: Embeddings to compare, shape (N, D)
+
+    Returns:
+        Similarity scores, shape (N,)
+    """
+    ref = np.ascontiguousarray(ref, dtype=np.float32)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    if NUMBA_AVAILABLE and matrix.shape[0] < BLAS_CROSSOVER:
+        return _batch_dot_jit(ref, matrix)
+
+    return matrix @ ref
@@ -7,6 +7,7 @@ import os
 import sys
 import logging
 import cv2
+import numpy as np
 from pathlib import Path
 
 # Add parent directory to path
@@ -112,8 +113,14 @@ class KnownFacesSyncer:
                 self.skipped_count += 1
                 return
             
-            # Load image
-            frame = cv2.imread(image_path)
+            # Read the file once; the same bytes are decoded and stored
+            with open(image_path, 'rb') as f:
+                image_bytes = f.read()
+            
+            # Decode image
+            frame = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                frame = cv2.imread(image_path)
             if frame is None:
                 logger.error(f"  ✗ Failed to load image")
                 self.failed_count += 1
@@ -147,10 +154,6 @@ class KnownFacesSyncer:
                 self.failed_count += 1
                 return
             
-            # Read original image as bytes
-            with open(image_path, 'rb') as f:
-                image_bytes = f.read()
-            
             # Add to database
             metadata = {
                 'source_file': filename,
@@ -9,7 +9,7 @@ import cv2
 from typing import List, Dict, Optional
 from datetime import datetime
 
-from src.db_connection import DB
+from src.db_connection import DB, decode_embedding
 from src.face_utils import get_embedding
 
 logger = logging.getLogger(__name__)
@@ -24,12 +24,13 @@ class UnknownFaceHandler:
         """Initialize handler"""
         self.db = DB()
     
-    def get_unknown_faces(self, limit: int = 50) -> List[Dict]:
+    def get_unknown_faces(self, limit: int = 50, format_dates: bool = False) -> List[Dict]:
         """
         Get all unknown face detections pending review.
         
         Args:
             limit: Maximum number of records to return
+            format_dates: Return timestamps as ISO strings
         
         Returns:
             List of unknown face records
@@ -38,7 +39,8 @@ class UnknownFaceHandler:
             unknowns = self.db.get_detection_logs(
                 limit=limit,
                 status="Unauthorized",
-                review_flag=True
+                review_flag=True,
+                format_dates=format_dates
             )
             
             logger.info(f"Retrieved {len(unknowns)} unknown faces for review")
@@ -89,7 +91,7 @@ class UnknownFaceHandler:
                 return False
             
             # Extract embedding and image
-            embedding = np.array(log['embedding'])
+            embedding = decode_embedding(log['embedding'])
             image_id = log['image_id']
             
             # Get image bytes
@@ -201,39 +203,77 @@ class UnknownFaceHandler:
         """
         try:
             from bson.objectid import ObjectId
-            from src.face_utils import cosine_similarity
+            from src.sim_kernels import batch_cosine
             
             # Get reference face
             ref_log = self.db.logs_coll.find_one({'_id': ObjectId(log_id)})
             if not ref_log:
                 return []
             
-            ref_embedding = np.array(ref_log['embedding'])
+            ref_embedding = decode_embedding(ref_log['embedding']).copy()
+            ref_norm = np.linalg.norm(ref_embedding)
+            if ref_norm > 0:
+                ref_embedding /= ref_norm
             
-            # Get all other unknowns
-            unknowns = self.db.get_detection_logs(
-                limit=1000,
-                status="Unauthorized",
-                review_flag=True
-            )
+            # Stream other unknowns, fetching only _id and embedding
+            cursor = self.db.logs_coll.find(
+                {
+                    'status': 'Unauthorized',
+                    'review_flag': True,
+                    '_id': {'$ne': ObjectId(log_id)}
+                },
+                {'_id': 1, 'embedding': 1}
+            ).sort('timestamp', -1).limit(1000).batch_size(256)
             
-            # Find similar ones
-            similar = []
-            for unknown in unknowns:
-                if unknown['_id'] == log_id:
+            # Fill the embedding matrix row by row as batches arrive
+            dim = ref_embedding.shape[0]
+            matrix = np.empty((1000, dim), dtype=np.float32)
+            ids = []
+            for doc in cursor:
+                if doc.get('embedding') is None:
                     continue
-                
-                unknown_embedding = np.array(unknown['embedding'])
-                similarity = cosine_similarity(ref_embedding, unknown_embedding)
-                
-                if similarity >= threshold:
-                    unknown['similarity'] = similarity
-                    similar.append(unknown)
+                embedding = decode_embedding(doc['embedding'])
+                if embedding.shape[0] != dim:
+                    continue
+                matrix[len(ids)] = embedding
+                ids.append(doc['_id'])
             
-            # Sort by similarity
-            similar.sort(key=lambda x: x['similarity'], reverse=True)
+            if not ids:
+                return []
+            
+            # Normalize and compare against all unknowns at once
+            matrix = matrix[:len(ids)]
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+            similarities = np.clip(batch_cosine(ref_embedding, matrix), 0.0, 1.0)
+            
+            # Keep the best matches above threshold
+            matches = np.flatnonzero(similarities >= threshold)
+            matches = matches[np.argsort(-similarities[matches], kind='stable')][:limit]
+            if len(matches) == 0:
+                return []
+            
+            # Load full records only for the matches
+            match_ids = [ids[i] for i in matches]
+            docs = {
+                doc['_id']: doc
+                for doc in self.db.logs_coll.find({'_id': {'$in': match_ids}})
+            }
+            
+            similar = []
+            for i in matches:
+                doc = docs.get(ids[i])
+                if doc is None:
+                    continue
+                # Same shape as get_detection_logs: string id, list embedding
+                doc['_id'] = str(doc['_id'])
+                if 'embedding' in doc:
+                    doc['embedding'] = decode_embedding(doc['embedding']).tolist()
+                doc['similarity'] = float(similarities[i])
+                similar.append(doc)
             
-            return similar[:limit]
+            return similar
             
         except Exception as e:
             logger.error(f"Similar search failed: {e}")
@@ -6,6 +6,12 @@ Web interface for monitoring, access logs, IDS alerts, and face management
 import os
 import sys
 import logging
+import hmac
+import hashlib
+import uuid
+import time
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 from functools import wraps
 import io
@@ -14,37 +20,112 @@ import cv2
 import numpy as np
 from PIL import Image
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, Response
+from flask import Flask, render_template, request, jsonify, session, g, redirect, url_for, send_file, Response, stream_with_context
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
+from flask.json.provider import DefaultJSONProvider
+from flask_caching import Cache
+from werkzeug.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+from cachetools import TTLCache
+
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from src.db_connection import DB
+from src.db_connection import DB, date_to_string, decode_embedding
 from src.unknown_handler import UnknownFaceHandler
 from src.face_utils import detect_faces, get_embedding
+from src.embedding_worker import get_embedding_worker
+from src._face_utils_numba import pick_largest_and_clamp
 from src.config import (
     FLASK_HOST, FLASK_PORT, FLASK_DEBUG, SECRET_KEY,
     DEFAULT_ADMIN_USER, DEFAULT_ADMIN_PASS, SESSION_TIMEOUT,
-    SOCKETIO_ASYNC_MODE, SOCKETIO_CORS_ALLOWED_ORIGINS
+    SOCKETIO_ASYNC_MODE, SOCKETIO_CORS_ALLOWED_ORIGINS, REDIS_URL,
+    USE_VERIFY_PASSWORD_CACHE, VERIFY_PASSWORD_CACHE_TTL, SOCKETIO_MESSAGE_QUEUE,
+    USE_EMBEDDING_WORKER, BRUTE_FORCE_BLOCK_SECONDS
 )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keep OpenCV single-threaded so its pool doesn't oversubscribe the workers
+cv2.setNumThreads(1)
+
+# SIMD JPEG decoder for uploads (needs PyTurboJPEG and libturbojpeg)
+_turbo_jpeg = None
+if TurboJPEG is not None:
+    try:
+        _turbo_jpeg = TurboJPEG()
+    except Exception as e:
+        logger.warning(f"TurboJPEG unavailable, using OpenCV to decode uploads: {e}")
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=SESSION_TIMEOUT)
+# Reject oversized uploads (max 10MB) before the body is buffered
+app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
 
-# Enable CORS
-CORS(app)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider serializing responses with orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        # Output is always compact unless Flask asks for indentation (debug mode);
+        # datetimes pass through to default() to keep Flask's HTTP-date format
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+# Use orjson for API responses when installed
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Enable CORS for the API only; pages and static files skip the hook
+CORS(app, resources={r"/api/*": {"origins": SOCKETIO_CORS_ALLOWED_ORIGINS}})
+
+# Per-process response cache for read-mostly API data
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 60})
 
 # Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins=SOCKETIO_CORS_ALLOWED_ORIGINS, async_mode=SOCKETIO_ASYNC_MODE)
+# With a message queue, producers outside this process emit directly and
+# the HTTP bridge endpoints below are only a fallback
+socketio = SocketIO(app, cors_allowed_origins=SOCKETIO_CORS_ALLOWED_ORIGINS, async_mode=SOCKETIO_ASYNC_MODE,
+                    message_queue=SOCKETIO_MESSAGE_QUEUE or None)
+
+# Native thread pool for blocking calls when running under eventlet
+tpool = None
+if SOCKETIO_ASYNC_MODE == 'eventlet':
+    from eventlet import tpool
+
+
+def _run_blocking(func, *args):
+    """Run a blocking call on a native OS thread under eventlet, inline otherwise"""
+    if tpool is not None:
+        return tpool.execute(func, *args)
+    return func(*args)
 
 # Initialize database and handlers
 db = DB()
@@ -58,103 +139,242 @@ USERS = {
     }
 }
 
+# Short-lived cache of password verification results:
+# (username, HMAC of password) -> bool. TTLCache is not thread-safe, so
+# every access goes through the lock
+_pw_cache = TTLCache(maxsize=10000, ttl=VERIFY_PASSWORD_CACHE_TTL) if USE_VERIFY_PASSWORD_CACHE else None
+_pw_cache_lock = threading.Lock()
+
+# Face crops from /api/analyze_face awaiting enrollment: crop_id -> JPEG bytes
+_face_crops = TTLCache(maxsize=256, ttl=600)
+_face_crops_lock = threading.Lock()
+
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
+# Read size for streaming GridFS images
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Analyses waiting on the embedding worker: job_id -> response fields
+_pending_analyses = TTLCache(maxsize=256, ttl=300)
+_pending_analyses_lock = threading.Lock()
+
 # Failed login tracking for Fail2Ban integration and brute force protection
 failed_logins = {}
 
 # Brute force protection: Track failed attempts per IP
-login_attempts = {}  # {ip: {'count': int, 'blocked_until': datetime, 'attempts': [timestamps]}}
+# {ip: {'attempts': deque of time.monotonic() stamps, 'blocked_until': monotonic deadline}}
+login_attempts = {}
 MAX_LOGIN_ATTEMPTS = 5
-BLOCK_DURATION_MINUTES = 5
+BLOCK_DURATION_SECONDS = BRUTE_FORCE_BLOCK_SECONDS
+
+
+def _format_duration(seconds: int) -> str:
+    """Human readable duration, e.g. '5 minutes', '1 minute 30 seconds', '2 seconds'"""
+    minutes, seconds = divmod(int(seconds), 60)
+    parts = []
+    if minutes:
+        parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    if seconds or not minutes:
+        parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+    return ' '.join(parts)
+
+
+BLOCK_DURATION_TEXT = _format_duration(BLOCK_DURATION_SECONDS)
+ATTEMPT_WINDOW_SECONDS = 900
+
+# Shared Redis counters when configured, so every worker sees the same
+# attempts and blocks; falls back to the in-memory dict above
+redis_client = None
+if REDIS_URL:
+    if redis is None:
+        logger.warning("REDIS_URL set but redis is not installed. Install with: pip install redis")
+    else:
+        try:
+            redis_client = redis.Redis.from_url(REDIS_URL)
+            redis_client.ping()
+            logger.info("✓ Using Redis for login attempt tracking")
+        except Exception as e:
+            logger.warning(f"Redis unavailable, using in-memory login tracking: {e}")
+            redis_client = None
+
+
+def _new_attempt_record():
+    return {'attempts': deque(maxlen=MAX_LOGIN_ATTEMPTS), 'blocked_until': 0.0}
+
+
+def _attempts_key(ip_address):
+    return f"ratelimit:ip:{ip_address}"
+
+
+def _blocked_key(ip_address):
+    return f"ratelimit:ip:{ip_address}:blocked"
+
+
+def _redis_failed(e):
+    """Log a Redis error; callers then fall back to the in-memory tracker"""
+    logger.warning(f"Redis error, using in-memory login tracking for this request: {e}")
 
 
 # ==================== Authentication ====================
 
-def login_required(f):
-    """Decorator to require login"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'username' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
-
-
-def admin_required(f):
-    """Decorator to require admin role"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'username' not in session:
-            return redirect(url_for('login'))
-        username = session.get('username')
-        if USERS.get(username, {}).get('role') != 'admin':
-            return jsonify({'error': 'Admin access required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
+@app.before_request
+def _load_user():
+    """Resolve the logged-in user once per request for the auth decorators"""
+    g.user = USERS.get(session['username']) if 'username' in session else None
+
+
+def auth(role=None):
+    """
+    Decorator factory requiring a logged-in user, and optionally a role.
+    
+    Usage: @auth() for any logged-in user, @auth('admin') for admins only.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user = g.user
+            if user is None:
+                return redirect(url_for('login'))
+            if role is not None and user.get('role') != role:
+                return jsonify({'error': f'{role.capitalize()} access required'}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def _check_password_hash(pwhash, password):
+    """
+    Run the password KDF off the event loop under eventlet.
+    
+    Hashing is CPU-bound for 100ms+, which would otherwise stall every
+    socket served by the worker; tpool runs it on a native OS thread.
+    """
+    return _run_blocking(check_password_hash, pwhash, password)
+
+
+def verify_password(username, password):
+    """Check credentials, reusing a recent result for the same username/password"""
+    user = USERS.get(username)
+    if not user or password is None:
+        return False
+    
+    if _pw_cache is None:
+        return _check_password_hash(user['password'], password)
+    
+    # Key on an HMAC so plain fast hashes of passwords are never kept in memory
+    digest = hmac.new(SECRET_KEY.encode(), password.encode(), hashlib.sha256).hexdigest()
+    key = (username, digest)
+    with _pw_cache_lock:
+        ok = _pw_cache.get(key)
+    if ok is None:
+        # Hash outside the lock so concurrent logins don't serialize on it
+        ok = _check_password_hash(user['password'], password)
+        with _pw_cache_lock:
+            _pw_cache[key] = ok
+    return ok
 
 
 def is_ip_blocked(ip_address):
     """Check if an IP address is currently blocked"""
-    if ip_address not in login_attempts:
-        return False, None
+    if redis_client is not None:
+        try:
+            remaining_ms = redis_client.pttl(_blocked_key(ip_address))
+            if remaining_ms and remaining_ms > 0:
+                return True, remaining_ms / 1000.0
+            return False, None
+        except redis.RedisError as e:
+            _redis_failed(e)
     
-    attempt_data = login_attempts[ip_address]
-    blocked_until = attempt_data.get('blocked_until')
+    attempt_data = login_attempts.get(ip_address)
+    if attempt_data is None or not attempt_data['blocked_until']:
+        return False, None
     
-    if blocked_until and datetime.now() < blocked_until:
-        remaining = (blocked_until - datetime.now()).total_seconds()
+    remaining = attempt_data['blocked_until'] - time.monotonic()
+    if remaining > 0:
         return True, remaining
     
     # Block expired, reset
-    if blocked_until and datetime.now() >= blocked_until:
-        login_attempts[ip_address] = {'count': 0, 'blocked_until': None, 'attempts': []}
-    
+    login_attempts[ip_address] = _new_attempt_record()
     return False, None
 
 
 def record_failed_login(ip_address, username):
-    """Record a failed login attempt and block IP if threshold reached"""
-    now = datetime.now()
+    """
+    Record a failed login attempt and block IP if threshold reached.
     
-    if ip_address not in login_attempts:
-        login_attempts[ip_address] = {'count': 0, 'blocked_until': None, 'attempts': []}
+    Returns:
+        (was_blocked, attempt_count) tuple
+    """
+    if redis_client is not None:
+        try:
+            key = _attempts_key(ip_address)
+            count, _ = redis_client.pipeline().incr(key).expire(key, ATTEMPT_WINDOW_SECONDS).execute()
+            if count < MAX_LOGIN_ATTEMPTS:
+                return False, count
+            
+            # Block and restart the count, matching the in-memory reset on expiry
+            redis_client.pipeline().setex(
+                _blocked_key(ip_address), BLOCK_DURATION_SECONDS, count
+            ).delete(key).execute()
+        except redis.RedisError as e:
+            _redis_failed(e)
+        else:
+            now = datetime.now()
+            _log_brute_force_block(ip_address, username, count,
+                                   now + timedelta(seconds=BLOCK_DURATION_SECONDS), now)
+            return True, count
     
-    # Clean up old attempts (older than 15 minutes)
-    login_attempts[ip_address]['attempts'] = [
-        t for t in login_attempts[ip_address]['attempts'] 
-        if (now - t).total_seconds() < 900
-    ]
+    now = time.monotonic()
+    attempt_data = login_attempts.get(ip_address)
+    if attempt_data is None:
+        attempt_data = login_attempts[ip_address] = _new_attempt_record()
     
-    # Record this attempt
-    login_attempts[ip_address]['attempts'].append(now)
-    login_attempts[ip_address]['count'] = len(login_attempts[ip_address]['attempts'])
+    # Drop attempts older than the window, then record this one
+    attempts = attempt_data['attempts']
+    while attempts and attempts[0] < now - ATTEMPT_WINDOW_SECONDS:
+        attempts.popleft()
+    attempts.append(now)
     
     # Block if threshold reached
-    if login_attempts[ip_address]['count'] >= MAX_LOGIN_ATTEMPTS:
-        login_attempts[ip_address]['blocked_until'] = now + timedelta(minutes=BLOCK_DURATION_MINUTES)
-        logger.warning(f"🔒 IP {ip_address} blocked for {BLOCK_DURATION_MINUTES} minutes after {MAX_LOGIN_ATTEMPTS} failed attempts")
-        
-        # Log to database for security monitoring
-        try:
-            db.logs_coll.insert_one({
-                'event_type': 'brute_force_block',
-                'ip_address': ip_address,
-                'username_attempted': username,
-                'attempts': login_attempts[ip_address]['count'],
-                'blocked_until': login_attempts[ip_address]['blocked_until'],
-                'timestamp': now
-            })
-        except Exception as e:
-            logger.error(f"Failed to log brute force block: {e}")
-        
-        return True
+    count = len(attempts)
+    if count >= MAX_LOGIN_ATTEMPTS:
+        attempt_data['blocked_until'] = now + BLOCK_DURATION_SECONDS
+        wall_now = datetime.now()
+        _log_brute_force_block(ip_address, username, count,
+                               wall_now + timedelta(seconds=BLOCK_DURATION_SECONDS), wall_now)
+        return True, count
+    
+    return False, count
+
+
+def _log_brute_force_block(ip_address, username, attempts, blocked_until, now):
+    """Log a new IP block and record it in the database for security monitoring"""
+    logger.warning(f"🔒 IP {ip_address} blocked for {BLOCK_DURATION_TEXT} after {MAX_LOGIN_ATTEMPTS} failed attempts")
     
-    return False
+    try:
+        db.logs_coll.insert_one({
+            'event_type': 'brute_force_block',
+            'ip_address': ip_address,
+            'username_attempted': username,
+            'attempts': attempts,
+            'blocked_until': blocked_until,
+            'timestamp': now
+        })
+    except Exception as e:
+        logger.error(f"Failed to log brute force block: {e}")
 
 
 def reset_login_attempts(ip_address):
     """Reset login attempts for an IP after successful login"""
-    if ip_address in login_attempts:
-        login_attempts[ip_address] = {'count': 0, 'blocked_until': None, 'attempts': []}
+    if redis_client is not None:
+        try:
+            redis_client.delete(_attempts_key(ip_address), _blocked_key(ip_address))
+        except redis.RedisError as e:
+            _redis_failed(e)
+    
+    # Also clears anything tracked in memory while Redis was unreachable
+    login_attempts.pop(ip_address, None)
 
 
 # ==================== Routes ====================
@@ -187,7 +407,7 @@ def login():
         # Check credentials
         user = USERS.get(username)
         
-        if user and check_password_hash(user['password'], password):
+        if user and verify_password(username, password):
             # Successful login
             session['username'] = username
             session['role'] = user['role']
@@ -204,21 +424,22 @@ def login():
             failed_logins[ip_address] = failed_logins.get(ip_address, 0) + 1
             
             # Record failed attempt and check if should block
-            was_blocked = record_failed_login(ip_address, username)
+            was_blocked, attempt_count = record_failed_login(ip_address, username)
             
             if was_blocked:
-                error_msg = f'Too many failed attempts. Your IP is blocked for {BLOCK_DURATION_MINUTES} minutes'
+                error_msg = f'Too many failed attempts. Your IP is blocked for {BLOCK_DURATION_TEXT}'
                 logger.warning(f"🔒 IP {ip_address} BLOCKED after {MAX_LOGIN_ATTEMPTS} failed attempts")
                 return render_template('login.html', error=error_msg, blocked=True)
             
             # Show remaining attempts
-            attempts_left = MAX_LOGIN_ATTEMPTS - login_attempts[ip_address]['count']
+            attempts_left = MAX_LOGIN_ATTEMPTS - attempt_count
             error_msg = f'Invalid credentials. {attempts_left} attempts remaining before block'
             
             # Log for Fail2Ban
-            logger.warning(f"⚠ Login failed: {username} from {ip_address} (attempt {login_attempts[ip_address]['count']}/{MAX_LOGIN_ATTEMPTS})")
+            logger.warning(f"⚠ Login failed: {username} from {ip_address} (attempt {attempt_count}/{MAX_LOGIN_ATTEMPTS})")
             
-            return render_template('login.html', error=error_msg, attempts_left=attempts_left)
+            return render_template('login.html', error=error_msg, attempts_left=attempts_left,
+                                   block_duration=BLOCK_DURATION_TEXT)
     
     return render_template('login.html')
 
@@ -233,36 +454,36 @@ def logout():
 
 
 @app.route('/dashboard')
-@login_required
+@auth()
 def dashboard():
     """Main dashboard with live feed and stats"""
-    stats = db.get_stats()
+    stats = _stats()
     return render_template('dashboard.html', stats=stats, username=session.get('username'))
 
 
 @app.route('/logs')
-@login_required
+@auth()
 def logs_page():
     """Access logs page"""
     return render_template('logs.html', username=session.get('username'))
 
 
 @app.route('/security')
-@login_required
+@auth()
 def security_page():
     """Security logs and IDS alerts page"""
     return render_template('security.html', username=session.get('username'))
 
 
 @app.route('/unknowns')
-@login_required
+@auth()
 def unknowns_page():
     """Unknown faces review page"""
     return render_template('unknowns.html', username=session.get('username'))
 
 
 @app.route('/enroll')
-@login_required
+@auth()
 def enroll_page():
     """Face enrollment page"""
     return render_template('enroll.html', username=session.get('username'))
@@ -270,12 +491,18 @@ def enroll_page():
 
 # ==================== API Endpoints ====================
 
+@cache.memoize(5)
+def _stats():
+    """Database statistics, shared by the dashboard, API and stats requests for 5s"""
+    return db.get_stats()
+
+
 @app.route('/api/stats')
-@login_required
+@auth()
 def api_stats():
     """Get database statistics"""
     try:
-        stats = db.get_stats()
+        stats = _stats()
         return jsonify(stats)
     except Exception as e:
         logger.error(f"Stats error: {e}")
@@ -283,7 +510,7 @@ def api_stats():
 
 
 @app.route('/api/logs')
-@login_required
+@auth()
 def api_logs():
     """Get detection logs with filters"""
     try:
@@ -291,12 +518,8 @@ def api_logs():
         status = request.args.get('status')
         camera_id = request.args.get('camera_id')
         
-        logs = db.get_detection_logs(limit=limit, status=status, camera_id=camera_id)
-        
-        # Convert timestamps to strings for JSON
-        for log in logs:
-            if 'timestamp' in log:
-                log['timestamp'] = log['timestamp'].isoformat()
+        logs = db.get_detection_logs(limit=limit, status=status, camera_id=camera_id,
+                                     format_dates=True)
         
         return jsonify(logs)
     except Exception as e:
@@ -305,65 +528,65 @@ def api_logs():
 
 
 @app.route('/api/image/<file_id>')
-@login_required
+@auth()
 def api_image(file_id):
     """Get face image from GridFS"""
     try:
-        image_bytes = db.get_image(file_id)
-        
-        if image_bytes:
-            return Response(image_bytes, mimetype='image/jpeg')
-        else:
+        grid_out = db.open_image(file_id)
+        if grid_out is None:
             return jsonify({'error': 'Image not found'}), 404
+        
+        # Stream in chunks so eventlet can switch between reads
+        response = Response(
+            stream_with_context(iter(lambda: grid_out.read(IMAGE_CHUNK_SIZE), b'')),
+            mimetype='image/jpeg',
+            headers={
+                'Content-Length': str(grid_out.length),
+                'Cache-Control': 'private, max-age=86400'
+            }
+        )
+        # GridFS files are immutable, so the file ID is a stable ETag
+        response.set_etag(str(grid_out._id))
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Image API error: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@cache.memoize(60)
+def _authorized_persons_cached():
+    """Authorized persons without embeddings, cached until the next enrollment"""
+    # Stringify ids and dates in MongoDB; older records use 'added_date'
+    persons = list(db.auth_coll.aggregate([
+        {'$project': {'embedding': 0}},
+        {'$addFields': {
+            '_id': {'$toString': '$_id'},
+            'image_id': {'$toString': '$image_id'},
+            'enrolled_date': date_to_string({'$ifNull': ['$enrolled_date', '$added_date']})
+        }}
+    ]))
+    
+    return persons
+
+
 @app.route('/api/authorized_persons')
-@login_required
+@auth()
 def api_authorized_persons():
     """Get all authorized persons with their details"""
     try:
-        # Fetch all authorized persons from database
-        persons = list(db.auth_coll.find({}))
-        
-        # Convert ObjectId and timestamps to strings
-        for person in persons:
-            person['_id'] = str(person['_id'])
-            if 'image_id' in person and person['image_id'] is not None:
-                person['image_id'] = str(person['image_id'])
-            else:
-                # If no image_id, try to use a default or skip
-                person['image_id'] = None
-                logger.warning(f"Person {person.get('name')} has no image_id")
-            
-            # Handle different date field names
-            if 'enrolled_date' in person:
-                person['enrolled_date'] = person['enrolled_date'].isoformat()
-            elif 'added_date' in person:
-                person['enrolled_date'] = person['added_date'].isoformat()
-            else:
-                person['enrolled_date'] = None
-        
-        return jsonify(persons)
+        return jsonify(_authorized_persons_cached())
     except Exception as e:
         logger.error(f"Authorized persons API error: {e}")
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/unknowns')
-@login_required
+@auth()
 def api_unknowns():
     """Get unknown faces for review"""
     try:
         limit = int(request.args.get('limit', 50))
-        unknowns = unknown_handler.get_unknown_faces(limit=limit)
-        
-        # Convert timestamps
-        for unknown in unknowns:
-            if 'timestamp' in unknown:
-                unknown['timestamp'] = unknown['timestamp'].isoformat()
+        unknowns = unknown_handler.get_unknown_faces(limit=limit, format_dates=True)
         
         return jsonify(unknowns)
     except Exception as e:
@@ -372,7 +595,7 @@ def api_unknowns():
 
 
 @app.route('/api/enroll', methods=['POST'])
-@admin_required
+@auth('admin')
 def api_enroll():
     """Enroll an unknown face as authorized"""
     try:
@@ -389,6 +612,8 @@ def api_enroll():
         success = unknown_handler.enroll_unknown_as_authorized(log_id, name)
         
         if success:
+            cache.delete_memoized(_authorized_persons_cached)
+            
             # Notify via WebSocket
             socketio.emit('face_enrolled', {'name': name, 'log_id': log_id})
             return jsonify({'success': True, 'message': f'Enrolled as {name}'})
@@ -401,7 +626,7 @@ def api_enroll():
 
 
 @app.route('/api/dismiss', methods=['POST'])
-@login_required
+@auth()
 def api_dismiss():
     """Dismiss an unknown face"""
     try:
@@ -424,20 +649,42 @@ def api_dismiss():
 
 
 @app.route('/api/blocked_ips')
-@login_required
+@auth()
 def api_blocked_ips():
     """Get list of currently blocked IPs"""
     try:
         blocked = []
         now = datetime.now()
         
+        if redis_client is not None:
+            try:
+                prefix, suffix = _attempts_key(''), ':blocked'
+                for key in redis_client.scan_iter(match=_blocked_key('*'), count=100):
+                    key = key.decode() if isinstance(key, bytes) else key
+                    pipe = redis_client.pipeline()
+                    remaining_ms, attempts = pipe.pttl(key).get(key).execute()
+                    if not remaining_ms or remaining_ms <= 0:
+                        continue
+                    blocked_until = now + timedelta(milliseconds=remaining_ms)
+                    blocked.append({
+                        'ip': key[len(prefix):-len(suffix)],
+                        'attempts': int(attempts or 0),
+                        'blocked_until': blocked_until.strftime('%Y-%m-%d %H:%M:%S'),
+                        'remaining_seconds': int(remaining_ms / 1000)
+                    })
+                return jsonify({'blocked_ips': blocked, 'count': len(blocked)})
+            except redis.RedisError as e:
+                _redis_failed(e)
+                blocked = []
+        
+        mono_now = time.monotonic()
         for ip, data in login_attempts.items():
-            blocked_until = data.get('blocked_until')
-            if blocked_until and now < blocked_until:
-                remaining = (blocked_until - now).total_seconds()
+            remaining = data['blocked_until'] - mono_now
+            if remaining > 0:
+                blocked_until = now + timedelta(seconds=remaining)
                 blocked.append({
                     'ip': ip,
-                    'attempts': data['count'],
+                    'attempts': len(data['attempts']),
                     'blocked_until': blocked_until.strftime('%Y-%m-%d %H:%M:%S'),
                     'remaining_seconds': int(remaining)
                 })
@@ -486,13 +733,17 @@ def api_detection():
 
 @app.route('/api/stream_frame', methods=['POST'])
 def api_stream_frame():
-    """Receive video frame from main.py for live streaming"""
+    """Receive video frame from main.py for live streaming (raw JPEG body)"""
     try:
-        data = request.get_json()
-        frame_data = data.get('frame')
+        if request.is_json:
+            # Older producers send the frame base64-encoded in JSON
+            frame_b64 = (request.get_json() or {}).get('frame')
+            frame_data = base64.b64decode(frame_b64) if frame_b64 else None
+        else:
+            frame_data = request.get_data()
         
         if frame_data:
-            # Broadcast frame to connected clients via WebSocket
+            # Broadcast frame to connected clients as a binary WebSocket message
             socketio.emit('video_frame', {'frame': frame_data})
             return jsonify({'success': True})
         else:
@@ -503,8 +754,68 @@ def api_stream_frame():
         return jsonify({'error': str(e)}), 500
 
 
+def _decode_upload(image_bytes, max_dimension):
+    """
+    Decode an uploaded image to BGR.
+    
+    JPEGs go through TurboJPEG when available, scaled down during decode
+    by the largest DCT factor that keeps them within max_dimension. Rotated
+    JPEGs use OpenCV, which applies the EXIF orientation.
+    """
+    if _turbo_jpeg is not None and image_bytes[:2] == b'\xff\xd8':
+        try:
+            if Image.open(io.BytesIO(image_bytes)).getexif().get(EXIF_ORIENTATION, 1) == 1:
+                width, height, _, _ = _turbo_jpeg.decode_header(image_bytes)
+                largest = max(width, height)
+                factors = [(n, d) for n, d in _turbo_jpeg.scaling_factors
+                           if n <= d and -(-largest * n // d) <= max_dimension]
+                factor = max(factors, key=lambda f: f[0] / f[1]) if factors else (1, 1)
+                return _turbo_jpeg.decode(image_bytes, scaling_factor=factor)
+        except Exception as e:
+            logger.debug(f"TurboJPEG decode failed, falling back to OpenCV: {e}")
+    
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def _embedding_error(error):
+    """Build the error response for a failed embedding extraction"""
+    if error == 'Out of memory':
+        return jsonify({
+            'success': False,
+            'error': 'Out of memory. Please try a smaller image or restart the server.'
+        }), 500
+    return jsonify({
+        'success': False,
+        'error': f'Embedding extraction failed: {error}'
+    }), 500
+
+
+def _analysis_response(embedding, analysis):
+    """Build the /api/analyze_face success response"""
+    if embedding is None:
+        return jsonify({
+            'success': False,
+            'error': 'Failed to extract face embedding. Please use a clearer photo.'
+        }), 400
+    
+    faces_count = analysis['faces_count']
+    logger.info(f"Face analyzed: {faces_count} face(s) detected, embedding size: {len(embedding)}")
+    
+    return jsonify({
+        'success': True,
+        'faces_count': faces_count,
+        'embedding_size': len(embedding),
+        'embedding': embedding.tolist(),
+        'crop_id': analysis['crop_id'],
+        'image_url': url_for('api_face_crop', crop_id=analysis['crop_id']),
+        'quality': 'Good' if faces_count == 1 else 'Multiple faces',
+        'face_bbox': analysis['face_bbox']
+    })
+
+
 @app.route('/api/analyze_face', methods=['POST'])
-@login_required
+@auth()
 def api_analyze_face():
     """Analyze uploaded face photo"""
     try:
@@ -516,31 +827,27 @@ def api_analyze_face():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No photo selected'}), 400
         
-        # Read image
+        # Read image (size already capped by MAX_CONTENT_LENGTH)
         image_bytes = file.read()
         
-        # Check file size (max 10MB)
-        if len(image_bytes) > 10 * 1024 * 1024:
-            return jsonify({'success': False, 'error': 'Image too large. Maximum size is 10MB.'}), 400
-        
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Detect on a copy bounded to 1024px, but crop from the decoded image
+        # (full resolution, or pre-scaled by TurboJPEG)
+        max_dimension = 1024
+        img = _decode_upload(image_bytes, max_dimension)
         
         if img is None:
             return jsonify({'success': False, 'error': 'Invalid image file'}), 400
         
-        # Resize large images to reduce memory usage
-        max_dimension = 1024
-        height, width = img.shape[:2]
-        if width > max_dimension or height > max_dimension:
-            scale = min(max_dimension / width, max_dimension / height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            logger.info(f"Resized image from {width}x{height} to {new_width}x{new_height}")
+        img_height, img_width = img.shape[:2]
+        scale = min(1.0, max_dimension / max(img_width, img_height))
+        if scale < 1.0:
+            detect_img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            logger.info(f"Detecting on {detect_img.shape[1]}x{detect_img.shape[0]} copy of {img_width}x{img_height} image")
+        else:
+            detect_img = img
         
-        # Detect faces
-        faces = detect_faces(img)
+        # Detect faces (model inference: off the event loop under eventlet)
+        faces = _run_blocking(detect_faces, detect_img)
         
         if len(faces) == 0:
             return jsonify({
@@ -548,26 +855,19 @@ def api_analyze_face():
                 'error': 'No face detected in the image. Please upload a clear frontal face photo.'
             }), 400
         
-        # Use the largest face (most prominent)
-        if len(faces) > 1:
-            faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)  # Sort by area (w*h)
-        
-        x, y, w, h = faces[0]
+        # Map boxes back to full resolution, then pick the largest face (by w*h)
+        # and clamp it to the image bounds
+        faces_full = (np.asarray(faces, dtype=np.float64) / scale).astype(np.int32)
+        x, y, w, h = pick_largest_and_clamp(faces_full, img_width, img_height)
+        x, y, w, h = int(x), int(y), int(w), int(h)
         
         # Validate face dimensions
-        if w <= 0 or h <= 0 or x < 0 or y < 0:
+        if w <= 0 or h <= 0:
             return jsonify({
                 'success': False,
                 'error': 'Invalid face detection. Please try another photo.'
             }), 400
         
-        # Ensure coordinates are within image bounds
-        img_height, img_width = img.shape[:2]
-        x = max(0, min(x, img_width - 1))
-        y = max(0, min(y, img_height - 1))
-        w = min(w, img_width - x)
-        h = min(h, img_height - y)
-        
         # Crop face (x, y, w, h format)
         face_img = img[y:y+h, x:x+w]
         
@@ -580,7 +880,7 @@ def api_analyze_face():
         
         # Resize face
         try:
-            face_img_resized = cv2.resize(face_img, (112, 112))
+            face_img_resized = cv2.resize(face_img, (112, 112), interpolation=cv2.INTER_AREA)
         except Exception as e:
             logger.error(f"Resize error: {e}, face_img shape: {face_img.shape}")
             return jsonify({
@@ -588,62 +888,106 @@ def api_analyze_face():
                 'error': 'Failed to resize face image. Please try another photo.'
             }), 400
         
+        # Keep the JPEG crop server-side for enrollment instead of base64 round-tripping it
+        _, buffer = cv2.imencode('.jpg', face_img_resized)
+        crop_id = uuid.uuid4().hex
+        with _face_crops_lock:
+            _face_crops[crop_id] = buffer.tobytes()
+        
+        analysis = {
+            'faces_count': len(faces),
+            'crop_id': crop_id,
+            'face_bbox': {'x': x, 'y': y, 'w': w, 'h': h}
+        }
+        
+        # Hand off to the embedding worker; the client polls status_url.
+        # Its multiprocessing queues block the eventlet hub, so they are
+        # only touched from a native thread
+        if USE_EMBEDDING_WORKER:
+            job_id = _run_blocking(get_embedding_worker().submit, face_img_resized)
+            with _pending_analyses_lock:
+                _pending_analyses[job_id] = analysis
+            return jsonify({
+                'success': True,
+                'pending': True,
+                'job_id': job_id,
+                'status_url': url_for('api_embedding_status', job_id=job_id)
+            }), 202
+        
         # Get embedding with error handling
         try:
             logger.info("Extracting face embedding...")
-            embedding = get_embedding(face_img_resized)
-            
-            if embedding is None:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to extract face embedding. Please use a clearer photo.'
-                }), 400
-                
+            embedding = _run_blocking(get_embedding, face_img_resized)
         except MemoryError:
             logger.error("MemoryError during embedding extraction")
-            return jsonify({
-                'success': False,
-                'error': 'Out of memory. Please try a smaller image or restart the server.'
-            }), 500
+            return _embedding_error('Out of memory')
         except Exception as e:
             logger.error(f"Error extracting embedding: {e}")
-            return jsonify({
-                'success': False,
-                'error': f'Embedding extraction failed: {str(e)}'
-            }), 500
+            return _embedding_error(str(e))
         
-        # Convert image to base64 for storage
-        _, buffer = cv2.imencode('.jpg', face_img_resized)
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        logger.info(f"Face analyzed: {len(faces)} face(s) detected, embedding size: {len(embedding)}")
-        
-        return jsonify({
-            'success': True,
-            'faces_count': len(faces),
-            'embedding_size': len(embedding),
-            'embedding': embedding.tolist(),
-            'image_data': img_base64,
-            'quality': 'Good' if len(faces) == 1 else 'Multiple faces',
-            'face_bbox': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)}
-        })
+        return _analysis_response(embedding, analysis)
     
+    except HTTPException:
+        # e.g. RequestEntityTooLarge from request.files: let the 413 handler answer
+        raise
     except Exception as e:
         logger.error(f"Face analysis error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/embedding/<job_id>')
+@auth()
+def api_embedding_status(job_id):
+    """Poll a face analysis queued on the embedding worker"""
+    with _pending_analyses_lock:
+        analysis = _pending_analyses.get(job_id)
+    if analysis is None:
+        return jsonify({'success': False, 'error': 'Analysis not found or expired'}), 404
+    
+    done, embedding, error = _run_blocking(get_embedding_worker().poll, job_id)
+    if not done:
+        return jsonify({'success': True, 'pending': True}), 202
+    
+    with _pending_analyses_lock:
+        _pending_analyses.pop(job_id, None)
+    if error:
+        logger.error(f"Error extracting embedding: {error}")
+        return _embedding_error(error)
+    return _analysis_response(embedding, analysis)
+
+
+@app.route('/api/face_crop/<crop_id>')
+@auth()
+def api_face_crop(crop_id):
+    """Get a face crop produced by /api/analyze_face"""
+    with _face_crops_lock:
+        image_bytes = _face_crops.get(crop_id)
+    if image_bytes is None:
+        return jsonify({'error': 'Face crop not found or expired'}), 404
+    return Response(image_bytes, mimetype='image/jpeg')
+
+
 @app.route('/api/enroll_person', methods=['POST'])
-@admin_required
+@auth('admin')
 def api_enroll_person():
     """Enroll a new authorized person"""
     try:
-        data = request.get_json()
+        # multipart/form-data: raw float32 'embedding' part and optional 'photo' file;
+        # JSON (legacy): embedding as a float list and base64 'image_data'
+        if request.is_json:
+            data = request.get_json()
+            embedding = data.get('embedding')
+            photo = None
+        else:
+            data = request.form
+            embedding_file = request.files.get('embedding')
+            embedding = embedding_file.read() if embedding_file else None
+            photo = request.files.get('photo')
         
         name = data.get('name', '').strip()
         role = data.get('role', '')
         notes = data.get('notes', '')
-        embedding = data.get('embedding')
+        crop_id = data.get('crop_id')
         image_data = data.get('image_data')
         
         if not name:
@@ -652,6 +996,11 @@ def api_enroll_person():
         if not embedding:
             return jsonify({'success': False, 'error': 'Face embedding is required'}), 400
         
+        try:
+            embedding = decode_embedding(embedding)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid face embedding'}), 400
+        
         # Sanitize name (replace spaces with underscores)
         name = name.replace(' ', '_')
         
@@ -663,19 +1012,38 @@ def api_enroll_person():
                 'error': f'Person with name "{name}" already exists'
             }), 400
         
-        # Decode image and save to GridFS
+        # The crop lives only in this process for a limited time; refuse to
+        # enroll without it rather than silently dropping the face image
+        image_bytes = None
+        if crop_id:
+            with _face_crops_lock:
+                image_bytes = _face_crops.pop(crop_id, None)
+            if image_bytes is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Face crop expired, please re-analyze the photo'
+                }), 400
+        
+        # Save the analyzed face crop (or a legacy base64 image) to GridFS
         image_id = None
-        if image_data:
-            try:
+        try:
+            if image_bytes is None and photo:
+                image_bytes = photo.read()
+            elif image_bytes is None and image_data:
                 image_bytes = base64.b64decode(image_data)
-                image_id = db.save_image(image_bytes)
-            except Exception as e:
-                logger.warning(f"Failed to save image: {e}")
+            if image_bytes:
+                image_id = db.save_image(
+                    image_bytes,
+                    filename=f"{name}.jpg",
+                    metadata={'type': 'authorized', 'name': name}
+                )
+        except Exception as e:
+            logger.warning(f"Failed to save image: {e}")
         
         # Add to database
         db.auth_coll.insert_one({
             'name': name,
-            'embedding': embedding,
+            'embedding': embedding.tolist(),
             'image_id': image_id,
             'role': role,
             'notes': notes,
@@ -683,6 +1051,8 @@ def api_enroll_person():
             'added_by': session.get('username')
         })
         
+        cache.delete_memoized(_authorized_persons_cached)
+        
         logger.info(f"New person enrolled: {name} by {session.get('username')}")
         
         # Notify via WebSocket
@@ -694,6 +1064,8 @@ def api_enroll_person():
             'name': name
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Enrollment error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -718,7 +1090,7 @@ def handle_disconnect():
 def handle_stats_request():
     """Send stats to client"""
     try:
-        stats = db.get_stats()
+        stats = _stats()
         emit('stats_update', stats)
     except Exception as e:
         logger.error(f"Stats request error: {e}")
@@ -732,6 +1104,13 @@ def not_found(e):
     return render_template('error.html', error='Page not found', code=404), 404
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    """413 error handler (upload over MAX_CONTENT_LENGTH)"""
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'success': False, 'error': f'Upload too large. Maximum size is {limit_mb}MB.'}), 413
+
+
 @app.errorhandler(500)
 def server_error(e):
     """500 error handler"""
@@ -741,6 +1120,23 @@ def server_error(e):
 
 # ==================== Main ====================
 
+def warm_models():
+    """Load the detector and embedding model before serving requests"""
+    logger.info("Warming up face models...")
+    try:
+        # JIT-compile the box kernel now (no-op without numba); same
+        # argument types as api_analyze_face so the signature is reused
+        pick_largest_and_clamp(np.zeros((1, 4), np.int32), 1, 1)
+        detect_faces(np.zeros((64, 64, 3), np.uint8))
+        if USE_EMBEDDING_WORKER:
+            get_embedding_worker().start()
+        else:
+            get_embedding(np.zeros((112, 112, 3), np.uint8))
+        logger.info("✓ Face models ready")
+    except Exception as e:
+        logger.warning(f"Model warmup failed: {e}")
+
+
 def main():
     """Run Flask app"""
     logger.info("=" * 60)
@@ -754,8 +1150,16 @@ def main():
     logger.info(f"Default credentials: {DEFAULT_ADMIN_USER} / {DEFAULT_ADMIN_PASS}")
     logger.info("\n⚠ CHANGE DEFAULT PASSWORD IN PRODUCTION!\n")
     
+    warm_models()
+    
+    # The Werkzeug development server is only used in threading mode;
+    # production runs under gunicorn + eventlet via src/webapp/wsgi.py
+    run_kwargs = {}
+    if SOCKETIO_ASYNC_MODE == 'threading':
+        run_kwargs['allow_unsafe_werkzeug'] = True
+    
     try:
-        socketio.run(app, host=FLASK_HOST, port=FLASK_PORT, debug=FLASK_DEBUG, allow_unsafe_werkzeug=True)
+        socketio.run(app, host=FLASK_HOST, port=FLASK_PORT, debug=FLASK_DEBUG, **run_kwargs)
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
 
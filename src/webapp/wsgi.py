@@ -0,0 +1,22 @@
+"""
+Smart Vault CCTV - WSGI Entry Point
+Production entry point for gunicorn with the eventlet worker
+
+Run from the project root:
+    gunicorn -k eventlet -w 1 --worker-connections 2000 -b 0.0.0.0:5000 src.webapp.wsgi:app
+"""
+
+import os
+
+import eventlet
+
+# Patch blocking stdlib modules (socket, threading, time) before any other
+# import, so pymongo and Flask-SocketIO cooperate with the event loop
+eventlet.monkey_patch()
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'eventlet')
+
+from src.webapp.app import app, socketio, warm_models  # noqa: E402
+
+# Load models at worker start, not on the first request
+warm_models()
@@ -1,56 +1,130 @@
 """
 Test Brute Force Protection
 Demonstrates the IP blocking feature after 5 failed login attempts
+
+Non-interactive runs (CI) pick the optional tests with environment variables:
+    BF_RUN_LONG=1   wait for the block to expire (pair with a small
+                    BRUTE_FORCE_BLOCK_SECONDS on the server and here)
+    BF_CHECK_API=1  check the blocked IPs API
 """
 
-import requests
+import argparse
+import http.client
+import json
+import os
+import signal
+import sys
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
 
 # Configuration
 BASE_URL = "http://localhost:5000"
-LOGIN_URL = f"{BASE_URL}/login"
+LOGIN_PATH = "/login"
+
+# Must match the server's setting; start it with e.g. BRUTE_FORCE_BLOCK_SECONDS=2
+# to make Test 2 take seconds instead of 5 minutes
+BLOCK_SECONDS = int(os.getenv('BRUTE_FORCE_BLOCK_SECONDS', 300))
+
+# Form bodies are encoded once and reused for every request
+_WRONG_CREDS = urlencode({'username': 'admin', 'password': 'wrongpassword'})
+_GOOD_CREDS = urlencode({'username': 'admin', 'password': 'changeme'})
+
+# Login page sentinels, matched against the raw response bytes (no decode).
+# They're taken verbatim from login.html / app.py; a bare "blocked" would
+# also match the "before your IP is blocked" warning shown before the block.
+_BLOCKED = b'ACCESS BLOCKED'
+_REMAINING = b' remaining'
+_COUNTDOWN = b'blocked for '
+
+
+_Response = namedtuple('_Response', ['status_code', 'headers', 'content'])
+
 
-def test_failed_logins():
+class _Session:
+    """Minimal stdlib HTTP client: one persistent connection plus a cookie jar"""
+    
+    def __init__(self):
+        url = urlsplit(BASE_URL)
+        self._conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+        self._cookies = {}
+    
+    def request(self, method, path, body=None):
+        """Send a request (never following redirects) and read the whole response"""
+        headers = {'Connection': 'keep-alive'}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self._cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self._cookies.items())
+        
+        try:
+            self._conn.request(method, path, body, headers)
+            response = self._conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # Server dropped the idle keep-alive connection: reconnect once
+            self._conn.close()
+            self._conn.request(method, path, body, headers)
+            response = self._conn.getresponse()
+        
+        content = response.read()
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(cookie).items():
+                self._cookies[name] = morsel.value
+        return _Response(response.status, response.headers, content)
+    
+    def post(self, path, body):
+        return self.request('POST', path, body)
+    
+    def get(self, path):
+        return self.request('GET', path)
+
+
+@lru_cache(maxsize=1)
+def _get_session():
+    """Client (and connection) shared by the sequential tests"""
+    return _Session()
+
+
+def test_failed_logins(serial=False):
     """Test multiple failed login attempts"""
     print("=" * 60)
     print("  Brute Force Protection Test")
     print("=" * 60)
     print()
-    print("Testing 6 failed login attempts...")
+    print(f"Testing 6 failed login attempts ({'serial' if serial else 'concurrent'})...")
     print("Expected: IP blocked after 5th attempt")
     print()
     
-    session = requests.Session()
+    if not serial:
+        return _failed_logins_concurrent()
+    
+    session = _get_session()
     
     for attempt in range(1, 7):
         print(f"\n[Attempt {attempt}] Trying wrong password...")
         
         try:
-            response = session.post(
-                LOGIN_URL,
-                data={
-                    'username': 'admin',
-                    'password': 'wrongpassword'
-                },
-                allow_redirects=False
-            )
+            response = session.post(LOGIN_PATH, _WRONG_CREDS)
             
             # Check response
             if response.status_code == 200:
-                content = response.text.lower()
+                content = response.content
                 
-                if 'blocked' in content:
+                if _BLOCKED in content:
                     print(f"✓ IP BLOCKED after {attempt} attempts!")
                     print("  Block message displayed correctly")
                     
                     # Extract remaining time if visible
-                    if 'minute' in content or 'second' in content:
+                    if _COUNTDOWN in content:
                         print("  Countdown timer showing")
                     
                     return True
                     
-                elif 'attempt' in content and 'remaining' in content:
+                elif _REMAINING in content:
                     # Extract attempts remaining
                     print(f"  Status: Failed login recorded")
                     print(f"  Message: Warnings displayed")
@@ -63,43 +137,90 @@ def test_failed_logins():
         except Exception as e:
             print(f"  Error: {e}")
             return False
+    
+    print("\n❌ Expected block after 5 attempts but didn't happen!")
+    return False
+
+
+def _failed_logins_concurrent():
+    """Fire all 6 attempts at once to probe the server's counter under a burst"""
+    # One client per thread: each owns its connection and cookie jar
+    sessions = [_Session() for _ in range(6)]
+    
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futures = [pool.submit(session.post, LOGIN_PATH, _WRONG_CREDS) for session in sessions]
         
-        time.sleep(0.5)  # Small delay between attempts
+        blocked = 0
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception as e:
+                print(f"  Error: {e}")
+                return False
+            
+            if response.status_code != 200:
+                print(f"  Unexpected status code: {response.status_code}")
+            elif _BLOCKED in response.content:
+                blocked += 1
+    
+    if blocked:
+        print(f"✓ IP BLOCKED: {blocked} of 6 concurrent attempts were refused")
+        return True
     
     print("\n❌ Expected block after 5 attempts but didn't happen!")
     return False
 
 
+def _wait_with_progress(wait_time, interval=30):
+    """
+    Sleep once for wait_time, printing the countdown every interval seconds.
+    
+    Progress comes from a SIGALRM interval timer instead of waking up in a
+    loop; platforms without setitimer just sleep.
+    """
+    remaining = [wait_time]
+    
+    def _tick(signum, frame):
+        remaining[0] -= interval
+        mins, secs = divmod(max(0, int(remaining[0])), 60)
+        sys.stdout.write(f"\r  Time remaining: {mins}m {secs}s")
+        sys.stdout.flush()
+    
+    if not hasattr(signal, 'setitimer'):
+        time.sleep(wait_time)
+        return
+    
+    mins, secs = divmod(int(wait_time), 60)
+    sys.stdout.write(f"  Time remaining: {mins}m {secs}s")
+    sys.stdout.flush()
+    
+    previous = signal.signal(signal.SIGALRM, _tick)
+    signal.setitimer(signal.ITIMER_REAL, interval, interval)
+    try:
+        time.sleep(wait_time)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
 def test_successful_after_block():
     """Test that valid login works after waiting for block to expire"""
     print("\n" + "=" * 60)
     print("  Testing Successful Login After Block Expires")
     print("=" * 60)
     print()
-    print("Waiting for block to expire (5 minutes)...")
-    print("This is a long test - you may want to skip it")
+    print(f"Waiting for block to expire ({BLOCK_SECONDS}s)...")
+    if BLOCK_SECONDS > 10:
+        print("This is a long test - set BRUTE_FORCE_BLOCK_SECONDS=2 on the server and here")
     print()
     
-    # Wait for block to expire
-    wait_time = 301  # 5 minutes + 1 second
-    
-    for remaining in range(wait_time, 0, -30):
-        mins = remaining // 60
-        secs = remaining % 60
-        print(f"  Time remaining: {mins}m {secs}s", end='\r')
-        time.sleep(30)
+    # Wait for block to expire, with a little slack
+    _wait_with_progress(BLOCK_SECONDS + 0.1)
     
     print("\n\n[After Block] Trying correct password...")
     
-    session = requests.Session()
-    response = session.post(
-        LOGIN_URL,
-        data={
-            'username': 'admin',
-            'password': 'changeme'
-        },
-        allow_redirects=False
-    )
+    session = _get_session()
+    response = session.post(LOGIN_PATH, _GOOD_CREDS)
     
     if response.status_code == 302 and '/dashboard' in response.headers.get('Location', ''):
         print("✓ Login successful after block expired!")
@@ -109,6 +230,19 @@ def test_successful_after_block():
         return False
 
 
+def _fetch_blocked(session):
+    """
+    GET /api/blocked_ips.
+    
+    Returns:
+        (status_code, json_data) tuple; json_data is None on error
+    """
+    response = session.get("/api/blocked_ips")
+    if response.status_code != 200:
+        return response.status_code, None
+    return response.status_code, json.loads(response.content)
+
+
 def check_blocked_ips_api():
     """Check the blocked IPs API endpoint"""
     print("\n" + "=" * 60)
@@ -117,25 +251,17 @@ def check_blocked_ips_api():
     print()
     
     # First login to get session
-    session = requests.Session()
-    response = session.post(
-        LOGIN_URL,
-        data={
-            'username': 'admin',
-            'password': 'changeme'
-        }
-    )
-    
-    if response.status_code != 200 or 'dashboard' not in response.url.lower():
+    session = _get_session()
+    response = session.post(LOGIN_PATH, _GOOD_CREDS)
+    
+    if response.status_code != 302 or '/dashboard' not in response.headers.get('Location', ''):
         print("❌ Need to login first with correct credentials")
         return False
     
     # Check blocked IPs API
-    api_url = f"{BASE_URL}/api/blocked_ips"
-    response = session.get(api_url)
+    status_code, data = _fetch_blocked(session)
     
-    if response.status_code == 200:
-        data = response.json()
+    if status_code == 200:
         print(f"✓ API accessible")
         print(f"  Blocked IPs: {data.get('count', 0)}")
         
@@ -150,32 +276,49 @@ def check_blocked_ips_api():
         
         return True
     else:
-        print(f"❌ API error: {response.status_code}")
+        print(f"❌ API error: {status_code}")
         return False
 
 
+def _opt_in(env_var, prompt):
+    """
+    Whether to run an optional test: env_var=1 enables it, and only an
+    interactive terminal is asked when the variable is unset.
+    """
+    value = os.environ.get(env_var)
+    if value is not None:
+        return value == '1'
+    if sys.stdin.isatty():
+        return input(prompt).lower() == 'y'
+    return False
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Test brute force protection')
+    parser.add_argument('--serial', action='store_true',
+                        help='Send failed attempts one at a time instead of concurrently')
+    args = parser.parse_args()
+    
     print("\n🔒 Smart Vault CCTV - Brute Force Protection Test")
     print()
     print("This script will test the brute force protection feature")
     print("by attempting multiple failed logins.")
     print()
-    input("Press Enter to continue (make sure Flask server is running)...")
-    print()
+    if sys.stdin.isatty():
+        input("Press Enter to continue (make sure Flask server is running)...")
+        print()
     
     # Test 1: Failed logins
-    success1 = test_failed_logins()
+    success1 = test_failed_logins(serial=args.serial)
     
     if success1:
         print("\n✅ Test 1 PASSED: IP blocking works correctly!")
     else:
         print("\n❌ Test 1 FAILED: IP blocking not working as expected")
     
-    # Ask about Test 2 (takes 5 minutes)
+    # Test 2 waits BLOCK_SECONDS (5 minutes by default): opt in with BF_RUN_LONG=1
     print()
-    response = input("\nRun Test 2? (waits 5 mins for block to expire) [y/N]: ")
-    
-    if response.lower() == 'y':
+    if _opt_in('BF_RUN_LONG', f"\nRun Test 2? (waits {BLOCK_SECONDS}s for block to expire) [y/N]: "):
         success2 = test_successful_after_block()
         if success2:
             print("\n✅ Test 2 PASSED: Login works after block expires!")
@@ -184,11 +327,9 @@ def main():
     else:
         print("\nSkipping Test 2 (block expiration test)")
     
-    # Test 3: API check (if logged in)
+    # Test 3: API check (if logged in): opt in with BF_CHECK_API=1
     print()
-    response = input("\nCheck Blocked IPs API? [y/N]: ")
-    
-    if response.lower() == 'y':
+    if _opt_in('BF_CHECK_API', "\nCheck Blocked IPs API? [y/N]: "):
         success3 = check_blocked_ips_api()
         if success3:
             print("\n✅ Test 3 PASSED: API working correctly!")